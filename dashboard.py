@@ -1,14 +1,37 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+import hashlib
+from contextlib import asynccontextmanager
+from pathlib import Path
 
-monitoring_app = FastAPI()
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
 
-@monitoring_app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard():
-    with open("water_dashboard.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return HTMLResponse(content = html_content)
+DASHBOARD_HTML = Path(__file__).parent / "water_dashboard.html"
+
+# Loaded once at startup; the handler serves from memory instead of
+# re-reading the file on every poll.
+_html_bytes: bytes = b""
+_etag: str = ""
+
+def load_dashboard_html():
+    """Read the dashboard page into memory and compute its ETag"""
+    global _html_bytes, _etag
+    _html_bytes = DASHBOARD_HTML.read_bytes()
+    _etag = hashlib.md5(_html_bytes).hexdigest()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_dashboard_html()
+    yield
+
+monitoring_app = FastAPI(lifespan=lifespan)
+
+@monitoring_app.get("/dashboard")
+async def dashboard(request: Request):
+    if request.headers.get("if-none-match") == _etag:
+        return Response(status_code=304)
+    return Response(
+        _html_bytes,
+        media_type="text/html",
+        headers={"ETag": _etag, "Cache-Control": "public, max-age=60"}
+    )
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(monitoring_app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -5,34 +5,131 @@ Handles external integrations: IoT devices, weather APIs, databases
 
 import asyncio
 import json
+import orjson
+import threading
+import time
 from typing import Any, Dict, List
 from datetime import datetime
 import sqlite3
 
 # Install: pip install mcp anthropic-mcp fastapi uvicorn
 
+import httpx
+from cachetools import TTLCache
 from mcp.server import Server
 from mcp import types
 from mcp.types import Resource, Tool, TextContent
-import requests
+
+# Simulated forecast series - immutable, shared across all calls so the
+# handler allocates nothing but the small per-call wrapper dict
+_FORECAST_RAINFALL_MM = (2, 5, 8, 12, 15, 10, 5, 2)
+_FORECAST_TEMPERATURE_C = (28, 27, 26, 25, 25, 26, 27, 28)
+_FORECAST_HUMIDITY_PCT = (75, 78, 82, 85, 88, 85, 80, 75)
+_FORECAST_WIND_KMH = (12, 15, 18, 20, 18, 15, 12, 10)
+
+# Simulated tank data - in production, query from IoT sensors
+_TANKS = {
+    "tank_drinking_1": {"total_capacity": 10000, "current_level": 5000},
+    "reservoir_agri_2": {"total_capacity": 50000, "current_level": 35000},
+    "recharge_pit_3": {"total_capacity": 20000, "current_level": 12000}
+}
+
+# Hot-path SQL as module-level constants: identical string objects keep
+# hitting the connection's prepared-statement cache instead of re-parsing
+_Q_INSERT_VALVE_ACTION = """
+    INSERT INTO valve_actions (valve_id, action, percentage, destination, reason, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_Q_INSERT_SENSOR_READING = """
+    INSERT INTO sensor_readings
+    (sensor_id, location, water_level, flow_rate, temperature, ph_level, alert_level, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_Q_CURRENT_SENSORS = """
+    SELECT sensor_id, location, water_level, flow_rate, temperature,
+           ph_level, alert_level, timestamp
+    FROM sensor_readings
+    WHERE timestamp > ?
+    ORDER BY timestamp DESC
+"""
+
+_Q_ACTIVE_ALERTS = """
+    SELECT id, sensor_id, alert_level, message, timestamp
+    FROM alerts
+    WHERE resolved = FALSE
+    ORDER BY timestamp DESC
+"""
+
+_Q_VALVE_STATUS = """
+    SELECT valve_id, action, percentage, destination, reason, timestamp
+    FROM valve_actions
+    WHERE timestamp > ?
+    ORDER BY timestamp DESC
+"""
 
 # ==================== MCP Server Implementation ====================
 
 class WaterManagementMCPServer:
     """MCP Server for water management integrations"""
-    
+
+    FLUSH_INTERVAL = 0.5  # seconds
+    FLUSH_MAX_ROWS = 100
+    MAINTENANCE_INTERVAL = 24 * 3600  # seconds
+    RETENTION_SECONDS = 30 * 24 * 3600
+
     def __init__(self):
         self.server = Server("water-management-mcp")
         self.db_path = "water_management.db"
         self.setup_database()
+        # Single long-lived connection shared by all handlers; WAL lets
+        # readers run concurrently with the (lock-serialized) writer.
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=256
+        )
+        self.conn.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+        for pragma in (
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            "PRAGMA busy_timeout=5000",
+            "PRAGMA temp_store=MEMORY",
+            "PRAGMA cache_size=-20000",
+        ):
+            self.conn.execute(pragma)
+        # Buffer for single readings; flushed as one transaction every
+        # FLUSH_INTERVAL seconds or FLUSH_MAX_ROWS rows, whichever first.
+        self._pending_readings: List[Dict] = []
+        self._buffer_lock = threading.Lock()
+        # Outbound SMS queue drained in batches by sms_worker so alert
+        # handlers return as soon as the message is enqueued
+        self._sms_q: asyncio.Queue = asyncio.Queue()
+        # Derived tank fields computed once per tank-table update rather
+        # than on every capacity query; short TTL cache on top for the
+        # per-selection result dicts
+        self._tanks_derived = self._derive_tank_fields(_TANKS)
+        self._capacity_cache = TTLCache(maxsize=64, ttl=5)
+        # One pooled async HTTP client for all outbound calls (weather,
+        # SMS, IoT gateway) so TCP+TLS handshakes are amortized across
+        # requests; closed via aclose() on shutdown
+        self.http = httpx.AsyncClient(
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            http2=True
+        )
         self.register_resources()
         self.register_tools()
-    
+
     def setup_database(self):
         """Initialize SQLite database"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
+
+        # Takes effect on fresh databases; lets incremental_vacuum
+        # reclaim pages freed by the retention delete
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
         # Sensor readings table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS sensor_readings (
@@ -44,7 +141,7 @@ class WaterManagementMCPServer:
                 temperature REAL,
                 ph_level REAL,
                 alert_level TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp INTEGER NOT NULL DEFAULT (strftime('%s','now'))
             )
         """)
         
@@ -57,7 +154,7 @@ class WaterManagementMCPServer:
                 percentage INTEGER,
                 destination TEXT,
                 reason TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp INTEGER NOT NULL DEFAULT (strftime('%s','now'))
             )
         """)
         
@@ -69,130 +166,196 @@ class WaterManagementMCPServer:
                 alert_level TEXT NOT NULL,
                 message TEXT,
                 resolved BOOLEAN DEFAULT FALSE,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp INTEGER NOT NULL DEFAULT (strftime('%s','now'))
             )
         """)
-        
+
+        # Convert any legacy text timestamps (from the old
+        # CURRENT_TIMESTAMP default) to unix epoch integers
+        for table in ("sensor_readings", "valve_actions", "alerts"):
+            cursor.execute(f"""
+                UPDATE {table}
+                SET timestamp = CAST(strftime('%s', timestamp) AS INTEGER)
+                WHERE typeof(timestamp) = 'text'
+            """)
+
+        # Covering indexes matching the hot dashboard queries: they hold
+        # every selected column, so the reads become index-only scans
+        # with no sort step and no table-heap lookups.
+        cursor.execute("DROP INDEX IF EXISTS idx_sensor_readings_ts")
+        cursor.execute("DROP INDEX IF EXISTS idx_valve_actions_ts")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sensor_readings_covering
+            ON sensor_readings(timestamp DESC, sensor_id, location, water_level,
+                               flow_rate, temperature, ph_level, alert_level)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_alerts_unresolved
+            ON alerts(resolved, timestamp DESC) WHERE resolved = 0
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_valve_actions_covering
+            ON valve_actions(timestamp DESC, valve_id, action, percentage,
+                             destination, reason)
+        """)
+
+        conn.commit()
+        # Refresh planner statistics so the new indexes get picked
+        cursor.execute("ANALYZE")
         conn.commit()
         conn.close()
     
     def register_resources(self):
         """Register MCP resources"""
-        
+
+        # The resource list is static; build it once and reuse it for
+        # both MCP list_resources and the REST endpoint
+        self.resources = [
+            Resource(
+                uri="water://sensors/current",
+                name="Current Sensor Readings",
+                mimeType="application/json",
+                description="Real-time water level and flow data from all sensors"
+            ),
+            Resource(
+                uri="water://alerts/active",
+                name="Active Alerts",
+                mimeType="application/json",
+                description="Currently active water overflow alerts"
+            ),
+            Resource(
+                uri="water://valves/status",
+                name="Valve Status",
+                mimeType="application/json",
+                description="Current status of all water valves"
+            )
+        ]
+
         @self.server.list_resources()
         async def list_resources() -> List[Resource]:
             """List available data resources"""
-            return [
-                Resource(
-                    uri="water://sensors/current",
-                    name="Current Sensor Readings",
-                    mimeType="application/json",
-                    description="Real-time water level and flow data from all sensors"
-                ),
-                Resource(
-                    uri="water://alerts/active",
-                    name="Active Alerts",
-                    mimeType="application/json",
-                    description="Currently active water overflow alerts"
-                ),
-                Resource(
-                    uri="water://valves/status",
-                    name="Valve Status",
-                    mimeType="application/json",
-                    description="Current status of all water valves"
-                )
-            ]
+            return self.resources
         
         @self.server.read_resource()
         async def read_resource(uri: str) -> str:
             """Read resource data"""
             
             if uri == "water://sensors/current":
-                return json.dumps(self.get_current_sensors())
-            
+                return json.dumps(await asyncio.to_thread(self.get_current_sensors))
+
             elif uri == "water://alerts/active":
-                return json.dumps(self.get_active_alerts())
-            
+                return json.dumps(await asyncio.to_thread(self.get_active_alerts))
+
             elif uri == "water://valves/status":
-                return json.dumps(self.get_valve_status())
+                return json.dumps(await asyncio.to_thread(self.get_valve_status))
             
             else:
                 return json.dumps({"error": "Resource not found"})
     
     def register_tools(self):
         """Register MCP tools"""
-        
+
+        # Tool schemas are static; build the list once and reuse it for
+        # both MCP list_tools and the REST endpoint
+        self.tools = [
+            Tool(
+                name="get_weather_forecast",
+                description="Get weather forecast for a location including rainfall predictions",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "location": {"type": "string", "description": "Location name or coordinates"},
+                        "hours": {"type": "integer", "description": "Forecast period in hours", "default": 24}
+                    },
+                    "required": ["location"]
+                }
+            ),
+            Tool(
+                name="control_valve",
+                description="Control water valve (open/close/partial)",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "valve_id": {"type": "string", "description": "Valve identifier"},
+                        "action": {"type": "string", "enum": ["open", "close", "partial"], "description": "Valve action"},
+                        "percentage": {"type": "integer", "description": "Opening percentage (0-100)", "default": 100}
+                    },
+                    "required": ["valve_id", "action"]
+                }
+            ),
+            Tool(
+                name="record_sensor_reading",
+                description="Record a new sensor reading to database",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "sensor_id": {"type": "string"},
+                        "location": {"type": "string"},
+                        "water_level": {"type": "number"},
+                        "flow_rate": {"type": "number"},
+                        "temperature": {"type": "number"},
+                        "ph_level": {"type": "number"},
+                        "alert_level": {"type": "string"}
+                    },
+                    "required": ["sensor_id", "location", "water_level", "flow_rate"]
+                }
+            ),
+            Tool(
+                name="record_sensor_readings_bulk",
+                description="Record a batch of sensor readings to database in one transaction",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "readings": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "sensor_id": {"type": "string"},
+                                    "location": {"type": "string"},
+                                    "water_level": {"type": "number"},
+                                    "flow_rate": {"type": "number"},
+                                    "temperature": {"type": "number"},
+                                    "ph_level": {"type": "number"},
+                                    "alert_level": {"type": "string"}
+                                },
+                                "required": ["sensor_id", "location", "water_level", "flow_rate"]
+                            }
+                        }
+                    },
+                    "required": ["readings"]
+                }
+            ),
+            Tool(
+                name="send_sms_alert",
+                description="Send SMS alert to water management authorities",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "phone_numbers": {"type": "array", "items": {"type": "string"}},
+                        "message": {"type": "string"},
+                        "priority": {"type": "string", "enum": ["low", "medium", "high", "critical"]}
+                    },
+                    "required": ["phone_numbers", "message"]
+                }
+            ),
+            Tool(
+                name="get_tank_capacity",
+                description="Get remaining capacity of water storage tanks",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "tank_ids": {"type": "array", "items": {"type": "string"}},
+                    }
+                }
+            )
+        ]
+
         @self.server.list_tools()
         async def list_tools() -> List[Tool]:
             """List available tools"""
-            return [
-                Tool(
-                    name="get_weather_forecast",
-                    description="Get weather forecast for a location including rainfall predictions",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "location": {"type": "string", "description": "Location name or coordinates"},
-                            "hours": {"type": "integer", "description": "Forecast period in hours", "default": 24}
-                        },
-                        "required": ["location"]
-                    }
-                ),
-                Tool(
-                    name="control_valve",
-                    description="Control water valve (open/close/partial)",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "valve_id": {"type": "string", "description": "Valve identifier"},
-                            "action": {"type": "string", "enum": ["open", "close", "partial"], "description": "Valve action"},
-                            "percentage": {"type": "integer", "description": "Opening percentage (0-100)", "default": 100}
-                        },
-                        "required": ["valve_id", "action"]
-                    }
-                ),
-                Tool(
-                    name="record_sensor_reading",
-                    description="Record a new sensor reading to database",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "sensor_id": {"type": "string"},
-                            "location": {"type": "string"},
-                            "water_level": {"type": "number"},
-                            "flow_rate": {"type": "number"},
-                            "temperature": {"type": "number"},
-                            "ph_level": {"type": "number"},
-                            "alert_level": {"type": "string"}
-                        },
-                        "required": ["sensor_id", "location", "water_level", "flow_rate"]
-                    }
-                ),
-                Tool(
-                    name="send_sms_alert",
-                    description="Send SMS alert to water management authorities",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "phone_numbers": {"type": "array", "items": {"type": "string"}},
-                            "message": {"type": "string"},
-                            "priority": {"type": "string", "enum": ["low", "medium", "high", "critical"]}
-                        },
-                        "required": ["phone_numbers", "message"]
-                    }
-                ),
-                Tool(
-                    name="get_tank_capacity",
-                    description="Get remaining capacity of water storage tanks",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "tank_ids": {"type": "array", "items": {"type": "string"}},
-                        }
-                    }
-                )
-            ]
-        
+            return self.tools
+
         @self.server.call_tool()
         async def call_tool(name: str, arguments: Any) -> List[TextContent]:
             """Execute tool"""
@@ -213,9 +376,18 @@ class WaterManagementMCPServer:
                 return [TextContent(type="text", text=json.dumps(result))]
             
             elif name == "record_sensor_reading":
-                result = self.record_sensor_reading(arguments)
+                # The buffer append is cheap, but every FLUSH_MAX_ROWS-th
+                # call runs the batch insert (and its fsync) — keep that
+                # off the event loop like the bulk path
+                result = await asyncio.to_thread(self.record_sensor_reading, arguments)
                 return [TextContent(type="text", text=json.dumps(result))]
-            
+
+            elif name == "record_sensor_readings_bulk":
+                result = await asyncio.to_thread(
+                    self.record_sensor_readings_bulk, arguments["readings"]
+                )
+                return [TextContent(type="text", text=json.dumps(result))]
+
             elif name == "send_sms_alert":
                 result = await self.send_sms_alert(
                     arguments["phone_numbers"],
@@ -240,14 +412,14 @@ class WaterManagementMCPServer:
         
         try:
             # For demo purposes, returning simulated data
-            # In production, use: requests.get(f"https://api.openweathermap.org/...")
+            # In production: await self.http.get(f"https://api.openweathermap.org/...")
             return {
                 "location": location,
                 "forecast_hours": hours,
-                "rainfall_mm_per_hour": [2, 5, 8, 12, 15, 10, 5, 2],
-                "temperature_celsius": [28, 27, 26, 25, 25, 26, 27, 28],
-                "humidity_percent": [75, 78, 82, 85, 88, 85, 80, 75],
-                "wind_speed_kmh": [12, 15, 18, 20, 18, 15, 12, 10],
+                "rainfall_mm_per_hour": _FORECAST_RAINFALL_MM,
+                "temperature_celsius": _FORECAST_TEMPERATURE_C,
+                "humidity_percent": _FORECAST_HUMIDITY_PCT,
+                "wind_speed_kmh": _FORECAST_WIND_KMH,
                 "timestamp": datetime.now().isoformat()
             }
         except Exception as e:
@@ -257,19 +429,12 @@ class WaterManagementMCPServer:
         """Send command to IoT valve controller"""
         
         # In production, send HTTP/MQTT command to IoT gateway
-        # Example: requests.post("http://iot-gateway/api/valves", json={...})
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO valve_actions (valve_id, action, percentage, destination, reason)
-            VALUES (?, ?, ?, ?, ?)
-        """, (valve_id, action, percentage, "auto", "Overflow prevention"))
-        
-        conn.commit()
-        conn.close()
-        
+        # Example: await self.http.post("http://iot-gateway/api/valves", json={...})
+
+        # Run the insert (and its fsync) in a worker thread so the
+        # event loop keeps serving other requests meanwhile
+        await asyncio.to_thread(self._insert_valve_action, valve_id, action, percentage)
+
         return {
             "status": "success",
             "valve_id": valve_id,
@@ -278,168 +443,212 @@ class WaterManagementMCPServer:
             "timestamp": datetime.now().isoformat()
         }
     
+    def _insert_valve_action(self, valve_id: str, action: str, percentage: int):
+        with self._db_lock:
+            self.conn.execute(
+                _Q_INSERT_VALVE_ACTION,
+                (valve_id, action, percentage, "auto", "Overflow prevention", int(time.time()))
+            )
+            self.conn.commit()
+
     def record_sensor_reading(self, data: Dict) -> Dict:
-        """Save sensor reading to database"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO sensor_readings 
-            (sensor_id, location, water_level, flow_rate, temperature, ph_level, alert_level)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data["sensor_id"],
-            data["location"],
-            data["water_level"],
-            data["flow_rate"],
-            data.get("temperature"),
-            data.get("ph_level"),
-            data.get("alert_level", "normal")
-        ))
-        
-        conn.commit()
-        reading_id = cursor.lastrowid
-        conn.close()
-        
+        """Buffer a single sensor reading for the next batched insert"""
+
+        with self._buffer_lock:
+            self._pending_readings.append(data)
+            should_flush = len(self._pending_readings) >= self.FLUSH_MAX_ROWS
+
+        if should_flush:
+            self.flush_pending_readings()
+
         return {
-            "status": "success",
-            "reading_id": reading_id,
+            "status": "queued",
             "sensor_id": data["sensor_id"]
         }
+
+    def record_sensor_readings_bulk(self, rows: List[Dict]) -> Dict:
+        """Save many sensor readings in a single transaction (one fsync)"""
+
+        now = int(time.time())
+        with self._db_lock, self.conn:
+            self.conn.executemany(_Q_INSERT_SENSOR_READING, [
+                (
+                    r["sensor_id"],
+                    r["location"],
+                    r["water_level"],
+                    r["flow_rate"],
+                    r.get("temperature"),
+                    r.get("ph_level"),
+                    r.get("alert_level", "normal"),
+                    r.get("timestamp", now)
+                )
+                for r in rows
+            ])
+
+        return {
+            "status": "success",
+            "inserted": len(rows)
+        }
+
+    def flush_pending_readings(self):
+        """Write all buffered readings in one transaction"""
+        with self._buffer_lock:
+            rows, self._pending_readings = self._pending_readings, []
+        if rows:
+            self.record_sensor_readings_bulk(rows)
+
+    def run_maintenance(self):
+        """Delete rows past the retention window and refresh statistics"""
+        cutoff = int(time.time()) - self.RETENTION_SECONDS
+        with self._db_lock:
+            self.conn.execute("DELETE FROM sensor_readings WHERE timestamp < ?", (cutoff,))
+            self.conn.execute("DELETE FROM valve_actions WHERE timestamp < ?", (cutoff,))
+            self.conn.commit()
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA optimize")
+
+    async def maintenance_loop(self):
+        """Background task: nightly retention delete + planner refresh"""
+        while True:
+            await asyncio.sleep(self.MAINTENANCE_INTERVAL)
+            await asyncio.to_thread(self.run_maintenance)
+
+    async def aclose(self):
+        """Release the outbound HTTP connection pool"""
+        await self.http.aclose()
+        self.conn.execute("PRAGMA optimize")
+
+    async def reading_flush_loop(self):
+        """Background task: flush the reading buffer periodically"""
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await asyncio.to_thread(self.flush_pending_readings)
     
     async def send_sms_alert(self, phone_numbers: List[str], message: str, priority: str) -> Dict:
-        """Send SMS via Twilio or similar service"""
-        
-        # In production, integrate with Twilio:
-        # from twilio.rest import Client
-        # client = Client(account_sid, auth_token)
-        # message = client.messages.create(body=message, from_='+...', to=phone)
-        
-        print(f"📱 SMS Alert [{priority.upper()}]: {message}")
-        print(f"   Recipients: {', '.join(phone_numbers)}")
-        
+        """Queue an SMS alert for the background sender"""
+
+        await self._sms_q.put((phone_numbers, message, priority))
+
         return {
-            "status": "success",
+            "status": "queued",
             "sent_to": phone_numbers,
             "priority": priority,
             "timestamp": datetime.now().isoformat()
         }
+
+    async def sms_worker(self):
+        """Background task: drain the SMS queue in batches"""
+        while True:
+            batch = [await self._sms_q.get()]
+            while len(batch) < 20:
+                try:
+                    batch.append(self._sms_q.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            # In production, post each message to Twilio's REST API via
+            # the shared pool, overlapping the sends:
+            # await asyncio.gather(*(self.http.post(twilio_url, ...) for ...))
+            for phone_numbers, message, priority in batch:
+                print(f"📱 SMS Alert [{priority.upper()}]: {message}")
+                print(f"   Recipients: {', '.join(phone_numbers)}")
+
+            for _ in batch:
+                self._sms_q.task_done()
     
+    @staticmethod
+    def _derive_tank_fields(tanks: Dict) -> Dict:
+        """Precompute per-tank derived fields from raw capacity data"""
+        return {
+            tank_id: {
+                "capacity_liters": data["total_capacity"],
+                "current_level_liters": data["current_level"],
+                "available_capacity": data["total_capacity"] - data["current_level"],
+                "fill_percentage": (data["current_level"] / data["total_capacity"]) * 100
+            }
+            for tank_id, data in tanks.items()
+        }
+
     def get_tank_capacity(self, tank_ids: List[str]) -> Dict:
         """Query tank capacity information"""
-        
-        # Simulated tank data - in production, query from IoT sensors
-        tanks = {
-            "tank_drinking_1": {"total_capacity": 10000, "current_level": 5000},
-            "reservoir_agri_2": {"total_capacity": 50000, "current_level": 35000},
-            "recharge_pit_3": {"total_capacity": 20000, "current_level": 12000}
+
+        key = tuple(sorted(tank_ids)) if tank_ids else ()
+        cached = self._capacity_cache.get(key)
+        if cached is not None:
+            return cached
+
+        result = {
+            tank_id: self._tanks_derived[tank_id]
+            for tank_id in (tank_ids if tank_ids else self._tanks_derived.keys())
+            if tank_id in self._tanks_derived
         }
-        
-        result = {}
-        for tank_id in tank_ids if tank_ids else tanks.keys():
-            if tank_id in tanks:
-                data = tanks[tank_id]
-                result[tank_id] = {
-                    "capacity_liters": data["total_capacity"],
-                    "current_level_liters": data["current_level"],
-                    "available_capacity": data["total_capacity"] - data["current_level"],
-                    "fill_percentage": (data["current_level"] / data["total_capacity"]) * 100
-                }
-        
+        self._capacity_cache[key] = result
         return result
     
     # ==================== Helper Methods ====================
     
     def get_current_sensors(self) -> List[Dict]:
         """Get latest sensor readings"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT sensor_id, location, water_level, flow_rate, temperature, 
-                   ph_level, alert_level, timestamp
-            FROM sensor_readings
-            WHERE timestamp > datetime('now', '-1 hour')
-            ORDER BY timestamp DESC
-        """)
-        
-        readings = []
-        for row in cursor.fetchall():
-            readings.append({
-                "sensor_id": row[0],
-                "location": row[1],
-                "water_level": row[2],
-                "flow_rate": row[3],
-                "temperature": row[4],
-                "ph_level": row[5],
-                "alert_level": row[6],
-                "timestamp": row[7]
-            })
-        
-        conn.close()
-        return readings
+        # Bind the cutoff instead of datetime('now', ...) so SQLite
+        # compares against a constant integer
+        cutoff = int(time.time()) - 3600
+        cursor = self.conn.execute(_Q_CURRENT_SENSORS, (cutoff,))
+
+        return [dict(row) for row in cursor.fetchall()]
     
     def get_active_alerts(self) -> List[Dict]:
         """Get unresolved alerts"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, sensor_id, alert_level, message, timestamp
-            FROM alerts
-            WHERE resolved = FALSE
-            ORDER BY timestamp DESC
-        """)
-        
-        alerts = []
-        for row in cursor.fetchall():
-            alerts.append({
-                "id": row[0],
-                "sensor_id": row[1],
-                "alert_level": row[2],
-                "message": row[3],
-                "timestamp": row[4]
-            })
-        
-        conn.close()
-        return alerts
+        cursor = self.conn.execute(_Q_ACTIVE_ALERTS)
+
+        return [dict(row) for row in cursor.fetchall()]
     
     def get_valve_status(self) -> List[Dict]:
         """Get latest valve actions"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT valve_id, action, percentage, destination, reason, timestamp
-            FROM valve_actions
-            WHERE timestamp > datetime('now', '-6 hours')
-            ORDER BY timestamp DESC
-        """)
-        
-        actions = []
-        for row in cursor.fetchall():
-            actions.append({
-                "valve_id": row[0],
-                "action": row[1],
-                "percentage": row[2],
-                "destination": row[3],
-                "reason": row[4],
-                "timestamp": row[5]
-            })
-        
-        conn.close()
-        return actions
+        cutoff = int(time.time()) - 6 * 3600
+        cursor = self.conn.execute(_Q_VALVE_STATUS, (cutoff,))
+
+        return [dict(row) for row in cursor.fetchall()]
 
 
 # ==================== FastAPI REST API Wrapper ====================
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from dashboard import monitoring_app, load_dashboard_html
 
-app = FastAPI(title="Water Management MCP API")
 mcp_server = WaterManagementMCPServer()
 
+# Serialized once at import; the resource list never changes at runtime
+_RESOURCES_JSON = orjson.dumps(
+    {"resources": [r.model_dump(mode="json") for r in mcp_server.resources]}
+)
+_TOOLS_JSON = orjson.dumps(
+    {"tools": [t.model_dump(mode="json") for t in mcp_server.tools]}
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mounted sub-app lifespans don't run, so preload its page here
+    load_dashboard_html()
+    flush_task = asyncio.create_task(mcp_server.reading_flush_loop())
+    sms_task = asyncio.create_task(mcp_server.sms_worker())
+    maintenance_task = asyncio.create_task(mcp_server.maintenance_loop())
+    yield
+    flush_task.cancel()
+    sms_task.cancel()
+    maintenance_task.cancel()
+    mcp_server.flush_pending_readings()
+    await mcp_server.aclose()
+
+app = FastAPI(title="Water Management MCP API", lifespan=lifespan)
+
+# Dashboard served from the same process/loop as the API it polls, so
+# its reads never cross a localhost socket to a second server
+app.mount("/monitoring", monitoring_app)
+
 @app.get("/")
 async def root():
     return {"message": "Water Management MCP Server", "status": "running"}
@@ -447,18 +656,12 @@ async def root():
 @app.get("/resources")
 async def list_resources():
     """List all MCP resources"""
-    resources = mcp_server.server.list_resources()
-    return {"resources": [r.dict() for r in resources]}
+    return Response(_RESOURCES_JSON, media_type="application/json")
 
 @app.get("/tools")
 async def list_tools():
     """List all MCP tools"""
-    # tools = mcp_server.server.list_tools()
-    req = types.ListToolsRequest()
-    response = await mcp_server.server.request_handlers[types.ListToolsRequest](req)
-    # Extract the list of tools from the wrapped result
-    tools = response
-    return {"tools": [i for i in tools]}
+    return Response(_TOOLS_JSON, media_type="application/json")
 
 @app.post("/tools/{tool_name}")
 async def execute_tool(tool_name: str, arguments: Dict):
@@ -474,15 +677,37 @@ async def execute_tool(tool_name: str, arguments: Dict):
     # return {"result": response.get("root") if response else None}
     return response
 
+_STREAM_CHUNK_ROWS = 500
+
+async def _stream_rows(sql: str, params=()):
+    """Yield a JSON array row by row without materializing the result"""
+    cursor = await asyncio.to_thread(mcp_server.conn.execute, sql, params)
+    yield b"["
+    first = True
+    while True:
+        rows = await asyncio.to_thread(cursor.fetchmany, _STREAM_CHUNK_ROWS)
+        if not rows:
+            break
+        for row in rows:
+            chunk = orjson.dumps(dict(row))
+            yield chunk if first else b"," + chunk
+            first = False
+    yield b"]"
+
 @app.get("/sensors/current")
 async def get_sensors():
     """Get current sensor readings"""
-    return mcp_server.get_current_sensors()
+    cutoff = int(time.time()) - 3600
+    return StreamingResponse(
+        _stream_rows(_Q_CURRENT_SENSORS, (cutoff,)), media_type="application/json"
+    )
 
 @app.get("/alerts/active")
 async def get_alerts():
     """Get active alerts"""
-    return mcp_server.get_active_alerts()
+    return StreamingResponse(
+        _stream_rows(_Q_ACTIVE_ALERTS), media_type="application/json"
+    )
 
 @app.post("/valve/control")
 async def control_valve(valve_id: str, action: str, percentage: int = 100):
@@ -491,5 +716,16 @@ async def control_valve(valve_id: str, action: str, percentage: int = 100):
     return result
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # One worker per core; WAL + busy_timeout keeps the shared SQLite
+    # file safe across worker processes
+    uvicorn.run(
+        "mcp_server:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=os.cpu_count(),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
@@ -35,6 +35,11 @@ async def test_prediction_agent():
     assert 'overflow_probability_6h' in result
     print("✅ Prediction Agent Test Passed")
 
+async def main():
+    # One loop, both tests in flight at once — they only share the
+    # network-bound Groq client
+    sensor_result, _ = await asyncio.gather(test_sensor_agent(), test_prediction_agent())
+    print(sensor_result)
+
 # Run tests
-print(asyncio.run(test_sensor_agent()))
-asyncio.run(test_prediction_agent())
\ No newline at end of file
+asyncio.run(main())
\ No newline at end of file